@@ -1,50 +1,160 @@
 import sqlite3
-import json
 import os
+import atexit
 import random
-import string
+import base64
+import secrets
+import threading
+import queue
+import time
+import functools
+import itertools
+from functools import wraps
+from types import MappingProxyType
+from contextlib import contextmanager
 from datetime import datetime, timedelta, timezone
-from collections import defaultdict
+from collections import OrderedDict, defaultdict, deque
 
 from flask import (
     Flask, g, render_template, request,
-    redirect, url_for, session, flash, jsonify, make_response
+    redirect, url_for, session, flash, jsonify, make_response, abort
 )
 from werkzeug.security import generate_password_hash, check_password_hash
+import orjson
 
 # Configuration
 DATABASE = "frms.db"
 NOSQL_FILE = os.path.join("data", "rosters_nosql.json")
 INFANT_AGE = 3
+# hashlib.scrypt runs in C (OpenSSL); legacy pbkdf2 hashes are upgraded on login
+PASSWORD_HASH_METHOD = "scrypt"
+DB_POOL_SIZE = 8          # idle SQLite connections kept for reuse
+LOG_FLUSH_INTERVAL = 1.0  # seconds between background log writes
+LOG_FLUSH_BATCH = 100     # flush early once this many events are queued
+LOG_QUEUE_MAX = 10000     # queued events beyond this are dropped (writer stalled)
+LOG_PRUNE_INTERVAL = 3600 # seconds between background log prunes
+LOG_PRUNE_BATCH = 5000    # rows deleted per prune transaction
+SCHEMA_VERSION = 1        # bump whenever create_schema changes (stored in PRAGMA user_version)
+ROSTER_CACHE_MAX = 256    # flights whose last generated roster is remembered (LRU)
 
 app = Flask(__name__)
 # Secret key is required for session management
 app.config["SECRET_KEY"] = "change-this-in-production"
 
+# Fixed queries shared by several routes; one SQL text per query so sqlite3's
+# per-connection statement cache prepares each only once
+SQL_FLIGHT_BY_NO = "SELECT * FROM flights WHERE flight_no=?"
+SQL_FLIGHT_PASSENGERS = "SELECT * FROM passengers WHERE flight_no=?"
+SQL_PNR_PASSENGERS = "SELECT * FROM passengers WHERE pnr=?"
+# Two statements on purpose: "(? IS NULL OR level=?)" can't seek idx_logs_level_timestamp
+SQL_LOGS_RECENT = "SELECT * FROM logs ORDER BY timestamp DESC LIMIT 200"
+SQL_LOGS_BY_LEVEL = "SELECT * FROM logs WHERE level=? ORDER BY timestamp DESC LIMIT 200"
+
 # ---------- DB HELPERS ----------
 
+# Idle (path, connection) pairs reused across requests; most recently returned first
+_pool = queue.LifoQueue(maxsize=DB_POOL_SIZE)
+# Databases already switched to WAL (journal_mode is persistent, so once per file is enough)
+_wal_databases = set()
+
+def connect_db(path):
+    """
+    Open a SQLite connection tuned for the web app (WAL, mmap, larger cache).
+    Connections are in autocommit mode; wrap multi-statement writes in transaction().
+    path may also be a "file:" URI (e.g. the in-memory test databases).
+    """
+    # Prepared statements are cached per connection by SQL text; room for every query in the app
+    conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, cached_statements=256, uri=True)
+    conn.row_factory = sqlite3.Row
+    if path not in _wal_databases:
+        conn.execute("PRAGMA journal_mode=WAL")
+        _wal_databases.add(path)
+    conn.execute("PRAGMA busy_timeout=5000")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA mmap_size=268435456")
+    conn.execute("PRAGMA cache_size=-20000")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA foreign_keys=ON")
+    return conn
+
 def get_db():
-    """Connect to the SQLite database."""
+    """Check a connection out of the pool for this request (opens one if none is idle)."""
     if "db" not in g:
-        g.db = sqlite3.connect(DATABASE)
-        g.db.row_factory = sqlite3.Row
+        conn = None
+        while conn is None:
+            try:
+                path, conn = _pool.get_nowait()
+            except queue.Empty:
+                conn = connect_db(DATABASE)
+                break
+            if path != DATABASE:
+                # Pooled for a database we no longer use (tests repoint DATABASE)
+                conn.close()
+                conn = None
+        g.db, g.db_path = conn, DATABASE
     return g.db
 
+@contextmanager
+def transaction(db, immediate=False):
+    """
+    Run a block of writes as one explicit BEGIN ... COMMIT (rolled back on error).
+    immediate=True takes the write lock up front (BEGIN IMMEDIATE), so the block
+    waits on busy_timeout at the start instead of failing halfway through.
+    Inside an open transaction the block just joins it (the outer one commits).
+    """
+    if db.in_transaction:
+        yield db
+        return
+    db.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+    try:
+        yield db
+    except BaseException:
+        db.rollback()
+        raise
+    db.commit()
+
 @app.teardown_appcontext
 def close_db(error):
-    """Close the database connection at end of request."""
+    """Return the request's connection to the pool, dropping any uncommitted work."""
     db = g.pop("db", None)
-    if db is not None:
+    if db is None:
+        return
+    if db.in_transaction:
+        db.rollback()
+    try:
+        _pool.put_nowait((g.pop("db_path"), db))
+    except queue.Full:
         db.close()
 
+def fetch_dicts(db, sql, params=()):
+    """Run a query and return plain dicts, built from raw tuples + column names (skips sqlite3.Row)."""
+    cur = db.cursor()
+    cur.row_factory = None
+    cur.execute(sql, params)
+    cols = [d[0] for d in cur.description]
+    return [dict(zip(cols, r)) for r in cur.fetchall()]
+
 def utc_now_iso():
     """Get current UTC timestamp as ISO string."""
     return datetime.now(timezone.utc).isoformat()
 
 def init_db():
-    """Initialize database tables and seed data if empty."""
+    """Initialize database tables and seed data if empty, in a single transaction."""
     db = get_db()
-
+    # Already at the current schema -> nothing to create, upgrade or seed
+    if db.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+        return
+    # Startup bulk load: no per-commit syncs; the pooled connection gets NORMAL back
+    db.execute("PRAGMA synchronous=OFF")
+    try:
+        with transaction(db, immediate=True):
+            create_schema(db)
+            db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    finally:
+        db.execute("PRAGMA synchronous=NORMAL")
+
+def create_schema(db):
+    """Create/upgrade tables and indexes, seed if empty. Caller commits."""
     # Users Table
     db.execute("""
         CREATE TABLE IF NOT EXISTS users (
@@ -67,7 +177,8 @@ def init_db():
             destination TEXT,
             vehicle_type TEXT,
             shared_flight_no TEXT,
-            shared_company TEXT
+            shared_company TEXT,
+            latest_roster_id INTEGER
         )
     """)
 
@@ -96,6 +207,15 @@ def init_db():
         )
     """)
 
+    # Attendant <-> vehicle type (normalized attendants.vehicle_types)
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS attendant_vehicles (
+            attendant_id INTEGER NOT NULL,
+            vehicle_type TEXT NOT NULL,
+            PRIMARY KEY (attendant_id, vehicle_type)
+        )
+    """)
+
     # Passengers Table (With SSN and PNR)
     db.execute("""
         CREATE TABLE IF NOT EXISTS passengers (
@@ -112,13 +232,13 @@ def init_db():
         )
     """)
 
-    # Rosters Table (JSON Storage)
+    # Rosters Table (JSON Storage, orjson bytes stored as BLOB)
     db.execute("""
         CREATE TABLE IF NOT EXISTS rosters (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             flight_no TEXT NOT NULL,
             created_at TEXT NOT NULL,
-            data_json TEXT NOT NULL
+            data_json BLOB NOT NULL
         )
     """)
 
@@ -134,17 +254,87 @@ def init_db():
         )
     """)
 
-    db.commit()
+    # flights.latest_roster_id points at the newest roster snapshot; backfill older databases once
+    if not any(c["name"] == "latest_roster_id" for c in db.execute("PRAGMA table_info(flights)")):
+        db.execute("ALTER TABLE flights ADD COLUMN latest_roster_id INTEGER")
+        db.execute("""
+            UPDATE flights SET latest_roster_id = (
+                SELECT r.id FROM rosters r WHERE r.flight_no = flights.flight_no
+                ORDER BY r.created_at DESC, r.id DESC LIMIT 1
+            )
+        """)
+
+    check_and_update_schema(db)
+
+    # Indexes for the hot lookups (flight search, per-flight passengers/rosters, log view/prune)
+    db.execute("CREATE INDEX IF NOT EXISTS idx_flights_flight_no_nocase ON flights(flight_no COLLATE NOCASE)")
+    # (flight_no, seat_no) also serves plain flight_no lookups, so it replaces idx_passengers_flight
+    db.execute("CREATE INDEX IF NOT EXISTS idx_passengers_flight_seat ON passengers(flight_no, seat_no)")
+    db.execute("DROP INDEX IF EXISTS idx_passengers_flight")
+    db.execute("CREATE INDEX IF NOT EXISTS idx_passengers_pnr ON passengers(pnr)")
+    db.execute("CREATE INDEX IF NOT EXISTS idx_rosters_flight_created ON rosters(flight_no, created_at DESC)")
+    db.execute("CREATE INDEX IF NOT EXISTS idx_logs_timestamp ON logs(timestamp)")
+    db.execute("CREATE INDEX IF NOT EXISTS idx_logs_level_timestamp ON logs(level, timestamp DESC)")
+    db.execute("CREATE INDEX IF NOT EXISTS idx_attendant_vehicles_type ON attendant_vehicles(vehicle_type)")
+    db.execute("CREATE INDEX IF NOT EXISTS idx_pilots_vt_seniority_dist ON pilots(vehicle_type, seniority, max_distance_km)")
+
+    init_flight_search_index(db)
 
     # Seed data if flights are empty
     cur = db.execute("SELECT COUNT(*) AS c FROM flights")
     if cur.fetchone()["c"] == 0:
         seed_data(db)
 
-    prune_old_logs(db)
+    # Fill the join table for freshly seeded or older databases
+    if db.execute("SELECT 1 FROM attendant_vehicles LIMIT 1").fetchone() is None:
+        sync_attendant_vehicles(db)
+
+    # Planner statistics so the indexes above get used; init_db() only gets here on a
+    # new database or a SCHEMA_VERSION bump, so a full ANALYZE each time is cheap
+    db.execute("ANALYZE")
+
+def init_flight_search_index(db):
+    """Create the FTS5 search index over flights (kept in sync by triggers)."""
+    exists = db.execute("SELECT 1 FROM sqlite_master WHERE name='flights_fts'").fetchone()
+    try:
+        db.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS flights_fts USING fts5(
+                flight_no, date_time, source, destination,
+                content='flights', content_rowid='id'
+            )
+        """)
+    except sqlite3.OperationalError:
+        # SQLite built without FTS5 -> flight_search falls back to LIKE
+        return
+
+    db.execute("""
+        CREATE TRIGGER IF NOT EXISTS flights_fts_ai AFTER INSERT ON flights BEGIN
+            INSERT INTO flights_fts(rowid, flight_no, date_time, source, destination)
+            VALUES (new.id, new.flight_no, new.date_time, new.source, new.destination);
+        END
+    """)
+    db.execute("""
+        CREATE TRIGGER IF NOT EXISTS flights_fts_ad AFTER DELETE ON flights BEGIN
+            INSERT INTO flights_fts(flights_fts, rowid, flight_no, date_time, source, destination)
+            VALUES ('delete', old.id, old.flight_no, old.date_time, old.source, old.destination);
+        END
+    """)
+    # Only re-index when a searched column changes (not on latest_roster_id bumps)
+    db.execute("DROP TRIGGER IF EXISTS flights_fts_au")
+    db.execute("""
+        CREATE TRIGGER flights_fts_au AFTER UPDATE OF flight_no, date_time, source, destination ON flights BEGIN
+            INSERT INTO flights_fts(flights_fts, rowid, flight_no, date_time, source, destination)
+            VALUES ('delete', old.id, old.flight_no, old.date_time, old.source, old.destination);
+            INSERT INTO flights_fts(rowid, flight_no, date_time, source, destination)
+            VALUES (new.id, new.flight_no, new.date_time, new.source, new.destination);
+        END
+    """)
+    if not exists:
+        # Index flights that were inserted before the FTS table existed
+        db.execute("INSERT INTO flights_fts(flights_fts) VALUES ('rebuild')")
 
 def seed_data(db):
-    """Insert sample data (expanded) so the system looks full."""
+    """Insert sample data (expanded) so the system looks full. Caller commits."""
     # ----------------- FLIGHTS (15) -----------------
     flights = [
         ("IT1234", "2025-12-10 09:30", 120, 800,  "Istanbul (IST)", "Berlin (BER)",  "A320", None, None),
@@ -243,48 +433,143 @@ def seed_data(db):
             VALUES (?,?,?,?,?)
         """, attendants)
 
-    # Admin user (keep)
-    pw_hash = generate_password_hash("admin123", method="pbkdf2:sha256")
-    db.execute("""
-        INSERT OR IGNORE INTO users (email, password_hash, role)
-        VALUES (?,?,?)
-    """, ("admin@frms.local", pw_hash, "admin"))
-
-    db.commit()
-
-def prune_old_logs(db):
-    """Delete logs older than 6 months."""
-    cutoff = datetime.now(timezone.utc) - timedelta(days=180)
-    db.execute("DELETE FROM logs WHERE timestamp < ?", (cutoff.isoformat(),))
-    db.commit()
+    # Admin user (keep); only pay for the password hash if the account is missing
+    if db.execute("SELECT 1 FROM users WHERE email=?", ("admin@frms.local",)).fetchone() is None:
+        pw_hash = generate_password_hash("admin123", method=PASSWORD_HASH_METHOD)
+        db.execute("""
+            INSERT INTO users (email, password_hash, role)
+            VALUES (?,?,?)
+        """, ("admin@frms.local", pw_hash, "admin"))
+
+def sync_attendant_vehicles(db):
+    """Fill attendant_vehicles by splitting each attendants.vehicle_types list. Caller commits."""
+    rows = [(a["id"], vt.strip())
+            for a in db.execute("SELECT id, vehicle_types FROM attendants").fetchall()
+            for vt in (a["vehicle_types"] or "").split(",") if vt.strip()]
+    db.executemany("INSERT OR IGNORE INTO attendant_vehicles (attendant_id, vehicle_type) VALUES (?,?)", rows)
+
+def prune_old_logs(db, max_batches=None):
+    """
+    Delete logs older than 6 months, LOG_PRUNE_BATCH rows per transaction so each
+    write lock is short. Stops early after max_batches; returns the rows deleted.
+    """
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=180)).isoformat()
+    deleted = batches = 0
+    while max_batches is None or batches < max_batches:
+        cur = db.execute("DELETE FROM logs WHERE rowid IN (SELECT rowid FROM logs WHERE timestamp < ? LIMIT ?)",
+                         (cutoff, LOG_PRUNE_BATCH))
+        deleted += cur.rowcount
+        batches += 1
+        if cur.rowcount < LOG_PRUNE_BATCH:
+            break
+    return deleted
+
+# Queued log rows as (database, row); written in batches by a background thread
+_log_buf = deque()
+_log_lock = threading.Lock()
+_log_wakeup = threading.Event()
+_log_writer_conn = None  # (path, connection) used only by flush_logs
+_log_thread = None
+_log_dropped = 0  # events discarded because the queue was full (running total)
+_log_dropped_reported = 0  # part of _log_dropped already written as a WARN row
 
 def log_action(level, action, details=""):
-    """Log system events."""
-    db = get_db()
+    """Log system events (queued, written by the background log writer)."""
+    global _log_dropped
+    if len(_log_buf) >= LOG_QUEUE_MAX:
+        # Never block or grow without bound on the request path
+        _log_dropped += 1
+        return
     user = current_user()
     email = user["email"] if user else "guest"
-    try:
-        db.execute("INSERT INTO logs (timestamp, user_email, level, action, details) VALUES (?,?,?,?,?)", 
-                   (utc_now_iso(), email, level, action, details))
-        db.commit()
-    except:
-        pass
+    _log_buf.append((DATABASE, (utc_now_iso(), email, level, action, details)))
+    start_log_writer()
+    if len(_log_buf) >= LOG_FLUSH_BATCH:
+        _log_wakeup.set()
+
+def _writer_conn(path):
+    """The log writer's own connection to path (call with _log_lock held)."""
+    global _log_writer_conn
+    if _log_writer_conn is None or _log_writer_conn[0] != path:
+        if _log_writer_conn is not None:
+            _log_writer_conn[1].close()
+        _log_writer_conn = (path, connect_db(path))
+    return _log_writer_conn[1]
+
+def db_exists(path):
+    """False once a database file is removed; "file:" URIs (in-memory DBs) are assumed present."""
+    return path.startswith("file:") or os.path.exists(path)
+
+def flush_logs():
+    """Write all queued log rows, one executemany + commit per database."""
+    global _log_dropped_reported
+    with _log_lock:
+        batches = defaultdict(list)
+        dropped = _log_dropped - _log_dropped_reported
+        if dropped:
+            # Make queue overflow visible in the logs it would otherwise silently thin out
+            _log_dropped_reported += dropped
+            batches[DATABASE].append((utc_now_iso(), "system", "WARN", "LogQueue",
+                                      f"{dropped} log events dropped (queue full)"))
+        while _log_buf:
+            path, row = _log_buf.popleft()
+            batches[path].append(row)
+        for path, rows in batches.items():
+            # Database gone (e.g. removed test DB) -> nothing to write into
+            if not db_exists(path):
+                continue
+            try:
+                conn = _writer_conn(path)
+                with transaction(conn, immediate=True):
+                    conn.executemany("INSERT INTO logs (timestamp, user_email, level, action, details) VALUES (?,?,?,?,?)",
+                                     rows)
+            except sqlite3.Error:
+                pass
+
+def _log_writer():
+    """
+    Background loop: flush queued logs every LOG_FLUSH_INTERVAL (or when woken),
+    and prune old logs once at start and then every LOG_PRUNE_INTERVAL.
+    """
+    last_prune = None
+    while True:
+        _log_wakeup.wait(LOG_FLUSH_INTERVAL)
+        _log_wakeup.clear()
+        flush_logs()
+        if last_prune is None or time.monotonic() - last_prune >= LOG_PRUNE_INTERVAL:
+            last_prune = time.monotonic()
+            # One batch per lock hold, so flush_logs() can run between batches
+            deleted = LOG_PRUNE_BATCH
+            while deleted == LOG_PRUNE_BATCH:
+                with _log_lock:
+                    if not db_exists(DATABASE):
+                        break
+                    try:
+                        deleted = prune_old_logs(_writer_conn(DATABASE), max_batches=1)
+                    except sqlite3.Error:
+                        break
+
+def start_log_writer():
+    """Start the background log writer thread once per process."""
+    global _log_thread
+    if _log_thread is None:
+        with _log_lock:
+            if _log_thread is None:
+                _log_thread = threading.Thread(target=_log_writer, name="log-writer", daemon=True)
+                _log_thread.start()
+
+atexit.register(flush_logs)
 
 def generate_pnr():
-    """Generate 6-char random alphanumeric PNR."""
-    return ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
+    """Generate 6-char random alphanumeric PNR (base32: A-Z, 2-7)."""
+    return base64.b32encode(secrets.token_bytes(4))[:6].decode("ascii")
 
-def check_and_update_schema():
-    """Ensure schema updates (like SSN column) are applied."""
-    db = get_db()
+def check_and_update_schema(db):
+    """Ensure schema updates (like SSN column) are applied. Runs from init_db (once per schema version); caller commits."""
     try:
         db.execute("SELECT ssn FROM passengers LIMIT 1")
     except sqlite3.OperationalError:
-        try:
-            db.execute("ALTER TABLE passengers ADD COLUMN ssn TEXT")
-            db.commit()
-        except:
-            pass
+        db.execute("ALTER TABLE passengers ADD COLUMN ssn TEXT")
 
 # ---------- SEAT MAP HELPERS ----------
 
@@ -295,43 +580,112 @@ PLANE_LAYOUTS = {
     "A330": {"rows": 30, "biz": 6, "cols": "ABCDEFGH"},
 }
 
+@functools.lru_cache(maxsize=8)
 def build_seat_map(vtype):
-    """Generate list of all seats for a plane type."""
+    """
+    Generate all seats for a plane type.
+    Layouts are static, so the result is cached and read-only (tuple of mapping proxies);
+    copy a seat before attaching per-request data to it.
+    """
     c = PLANE_LAYOUTS.get(vtype)
     seats = []
-    if not c: return []
+    if not c: return ()
     for r in range(1, c["rows"] + 1):
         for col in c["cols"]:
-            seats.append({"seat_no": f"{r}{col}", "seat_type": "business" if r <= c["biz"] else "economy"})
-    return seats
+            seats.append(MappingProxyType({"seat_no": f"{r}{col}", "row": r, "col": col, "seat_type": "business" if r <= c["biz"] else "economy"}))
+    return tuple(seats)
+
+@functools.lru_cache(maxsize=8)
+def seat_types_by_no(vtype):
+    """Read-only seat_no -> seat_type lookup for a plane type (cached like build_seat_map)."""
+    return MappingProxyType({s["seat_no"]: s["seat_type"] for s in build_seat_map(vtype)})
+
+@functools.lru_cache(maxsize=8)
+def seats_by_type(vtype):
+    """Read-only {"business": (seat_no, ...), "economy": (...)} for a plane type (cached)."""
+    buckets = {"business": [], "economy": []}
+    for s in build_seat_map(vtype):
+        buckets[s["seat_type"]].append(s["seat_no"])
+    return MappingProxyType({t: tuple(nos) for t, nos in buckets.items()})
+
+def seat_slot(vtype, seat_no):
+    """Index of seat_no in build_seat_map(vtype) (row-major), or None if not on this plane."""
+    c = PLANE_LAYOUTS.get(vtype)
+    if not c or not seat_no: return None
+    row, col = seat_no[:-1], c["cols"].find(seat_no[-1])
+    if not row.isdigit() or col < 0 or not 1 <= int(row) <= c["rows"]:
+        return None
+    return (int(row) - 1) * len(c["cols"]) + col
 
 def build_seat_rows(vehicle_type, passengers):
-    """Organize passengers into rows for visual display."""
+    """Organize passengers into rows for visual display (list of rows, row 1 first)."""
     seat_map = build_seat_map(vehicle_type)
-    seat_lookup = {p["seat_no"]: p for p in passengers if p.get("seat_no")}
+    # Occupant per seat position: one pass over passengers, then plain list indexing
+    occupants = [None] * len(seat_map)
+    for p in passengers:
+        slot = seat_slot(vehicle_type, p.get("seat_no"))
+        if slot is not None:
+            occupants[slot] = p
     
-    seat_rows_dict = defaultdict(list)
-    for seat in seat_map:
-        seat["occupant"] = seat_lookup.get(seat["seat_no"])
-        row_num = int(''.join(ch for ch in seat["seat_no"] if ch.isdigit()))
-        seat_rows_dict[row_num].append(seat)
-
-    return {r: sorted(seat_rows_dict[r], key=lambda s: s["seat_no"]) for r in sorted(seat_rows_dict.keys())}
+    # List of rows (index 0 = row 1); build_seat_map is row-major, so each row fills in column order
+    layout = PLANE_LAYOUTS.get(vehicle_type)
+    seat_rows = [[] for _ in range(layout["rows"])] if layout else []
+    for base, occupant in zip(seat_map, occupants):
+        seat_rows[base["row"] - 1].append(dict(base, occupant=occupant))
+    return seat_rows
+
+# (database, flight_no) -> (etag, roster_id) of the last roster generated, least recently used first
+_roster_cache = OrderedDict()
+
+def roster_etag(db, flight, pilots, cabin):
+    """Cheap change marker for a flight's roster inputs (bookings/deletes and the selected crew bump it)."""
+    row = db.execute("SELECT COUNT(*) AS c, MAX(id) AS m FROM passengers WHERE flight_no=?",
+                     (flight["flight_no"],)).fetchone()
+    crew = ",".join(str(member["id"]) for member in (*pilots, *cabin))
+    return f"{flight['id']}:{row['c']}:{row['m']}:{crew}"
+
+def remember_roster(flight_no, etag, roster_id):
+    """Record the roster just saved for this flight, evicting the least recently used entry when full."""
+    key = (DATABASE, flight_no)
+    _roster_cache[key] = (etag, roster_id)
+    _roster_cache.move_to_end(key)
+    while len(_roster_cache) > ROSTER_CACHE_MAX:
+        _roster_cache.popitem(last=False)
+
+def invalidate_roster_cache(flight_no):
+    """Forget the cached roster so the next generate writes a fresh snapshot."""
+    _roster_cache.pop((DATABASE, flight_no), None)
+
+def snapshot_etag(row, *extra):
+    """ETag for a stored roster; created_at changes whenever the snapshot is refreshed in place."""
+    return ":".join(str(part) for part in (row["id"], row["created_at"], *extra))
+
+def client_has_snapshot(etag):
+    """True if If-None-Match already names this version and no flash message is waiting to render."""
+    return "_flashes" not in session and etag in request.if_none_match
+
+def private_cache(resp, etag):
+    """Tag a roster response so the browser revalidates it with If-None-Match."""
+    resp.set_etag(etag)
+    resp.cache_control.private = True
+    resp.cache_control.must_revalidate = True
+    return resp
 
 def refresh_roster_snapshot(db, flight_no):
     """
     Called after check-in, seat change, or passenger delete.
     Updates the LATEST existing roster snapshot with fresh data,
-    OR creates a new one if none exists.
+    OR creates a new one if none exists. Joins the caller's transaction if one is open.
     """
+    invalidate_roster_cache(flight_no)
+
     # 1. Fetch Fresh Data from SQL
-    flight = db.execute("SELECT * FROM flights WHERE flight_no=?", (flight_no,)).fetchone()
+    flight = db.execute(SQL_FLIGHT_BY_NO, (flight_no,)).fetchone()
     if not flight: return
 
-    passengers = [dict(p) for p in db.execute("SELECT * FROM passengers WHERE flight_no=?", (flight_no,)).fetchall()]
-    # Mock Pilots/Cabin (same logic as generate_roster)
-    pilots = [dict(p) for p in db.execute("SELECT * FROM pilots LIMIT 2")]
-    cabin = [dict(a) for a in db.execute("SELECT * FROM attendants LIMIT 4")]
+    passengers = fetch_dicts(db, SQL_FLIGHT_PASSENGERS, (flight_no,))
+    # Pilots/Cabin (same logic as generate_roster)
+    pilots, cabin = select_crew(db, flight)
 
     roster_data = {
         "flight": dict(flight),
@@ -339,22 +693,18 @@ def refresh_roster_snapshot(db, flight_no):
         "cabin": cabin,
         "passengers": passengers
     }
-    json_str = json.dumps(roster_data)
+    json_bytes = orjson.dumps(roster_data)
     timestamp = utc_now_iso()
 
-    # 2. Check for an existing latest roster
-    latest = db.execute("SELECT id FROM rosters WHERE flight_no=? ORDER BY created_at DESC LIMIT 1", (flight_no,)).fetchone()
-
-    if latest:
-        # Update the existing snapshot to reflect the change
-        db.execute("UPDATE rosters SET data_json=?, created_at=? WHERE id=?", 
-                   (json_str, timestamp, latest['id']))
-    else:
-        # No roster exists, create one automatically
-        db.execute("INSERT INTO rosters (flight_no, created_at, data_json) VALUES (?,?,?)",
-                   (flight_no, timestamp, json_str))
-    
-    db.commit()
+    # 2. Update the latest snapshot in place, or create one (and point the flight at it)
+    with transaction(db, immediate=True):
+        latest = db.execute("SELECT latest_roster_id FROM flights WHERE flight_no=?", (flight_no,)).fetchone()[0]
+        cur = db.execute("UPDATE rosters SET data_json=?, created_at=? WHERE id=?",
+                         (json_bytes, timestamp, latest))
+        if cur.rowcount == 0:
+            cur = db.execute("INSERT INTO rosters (flight_no, created_at, data_json) VALUES (?,?,?)",
+                             (flight_no, timestamp, json_bytes))
+            db.execute("UPDATE flights SET latest_roster_id=? WHERE flight_no=?", (cur.lastrowid, flight_no))
 
 # ---------- ✅ EXTENDED VIEW HELPERS (ADDED) ----------
 
@@ -366,6 +716,32 @@ CABIN_CREW_RANGES = {
     "A330": (5, 10),
 }
 
+def select_crew(db, flight):
+    """
+    Pick the crew for a flight, letting SQLite do the filtering:
+    - pilots rated for the vehicle and distance -> first senior + first junior (one indexed seek each)
+    - cabin crew certified for the vehicle (attendant_vehicles), capped at the vehicle's max crew size
+    """
+    vtype = flight["vehicle_type"]
+    dist = flight["distance_km"] or 0
+    pilots = fetch_dicts(db, """
+        SELECT * FROM (SELECT * FROM pilots WHERE vehicle_type=? AND seniority='senior'
+                       AND max_distance_km>=? ORDER BY id LIMIT 1)
+        UNION ALL
+        SELECT * FROM (SELECT * FROM pilots WHERE vehicle_type=? AND seniority='junior'
+                       AND max_distance_km>=? ORDER BY id LIMIT 1)
+    """, (vtype, dist, vtype, dist))
+
+    cabin_max = CABIN_CREW_RANGES.get(vtype, (0, 4))[1]
+    cabin = fetch_dicts(db, """
+        SELECT a.* FROM attendants a
+        JOIN attendant_vehicles av ON av.attendant_id = a.id
+        WHERE av.vehicle_type=?
+        ORDER BY a.id
+        LIMIT ?
+    """, (vtype, cabin_max))
+    return pilots, cabin
+
 def build_extended_view(flight_row, pilots, cabin, passengers):
     """
     Builds 'Extended View' data:
@@ -480,16 +856,20 @@ def build_extended_view(flight_row, pilots, cabin, passengers):
 # ---------- AUTH & ROLES ----------
 
 def current_user():
-    """Get current logged-in user."""
-    if "user_id" not in session: return None
-    return get_db().execute("SELECT * FROM users WHERE id = ?", (session["user_id"],)).fetchone()
+    """Get current logged-in user (looked up once per request, cached on g)."""
+    if "user" not in g:
+        g.user = None
+        if "user_id" in session:
+            g.user = get_db().execute("SELECT id, email, role FROM users WHERE id = ?",
+                                      (session["user_id"],)).fetchone()
+    return g.user
 
 def login_required(role=None):
-    """Decorator for route protection."""
-    from functools import wraps
+    """Decorator for route protection (role is read from the users row on every request)."""
     def decorator(func):
         @wraps(func)
         def wrapper(*args, **kwargs):
+            # current_user() is cached on g, so the route reuses this lookup
             user = current_user()
             if user is None:
                 flash("Please log in first.", "warning")
@@ -501,6 +881,9 @@ def login_required(role=None):
         return wrapper
     return decorator
 
+require_login = login_required()
+require_admin = login_required(role="admin")
+
 # ---------- ROUTES: AUTH ----------
 
 @app.route("/", methods=["GET"])
@@ -516,7 +899,12 @@ def login():
         db = get_db()
         user = db.execute("SELECT * FROM users WHERE email = ?", (email,)).fetchone()
         if user and check_password_hash(user["password_hash"], password):
+            if user["password_hash"].startswith("pbkdf2:"):
+                # Rehash old pbkdf2 passwords with the cheaper-to-verify method
+                db.execute("UPDATE users SET password_hash=? WHERE id=?",
+                           (generate_password_hash(password, method=PASSWORD_HASH_METHOD), user["id"]))
             session["user_id"] = user["id"]
+            g.pop("user", None)
             log_action("INFO", "Login", f"User {email} logged in")
             return redirect(request.args.get("next") or url_for("dashboard"))
         log_action("WARN", "Login", f"Failed login attempt for {email}")
@@ -535,8 +923,7 @@ def register():
         db = get_db()
         try:
             db.execute("INSERT INTO users (email, password_hash, role) VALUES (?,?,?)", 
-                       (email, generate_password_hash(password, method="pbkdf2:sha256"), "viewer"))
-            db.commit()
+                       (email, generate_password_hash(password, method=PASSWORD_HASH_METHOD), "viewer"))
             flash("Registered. Please log in.", "success")
             return redirect(url_for("login"))
         except sqlite3.IntegrityError:
@@ -550,21 +937,22 @@ def logout():
     email = user["email"] if user else "unknown"
     log_action("INFO", "Logout", f"User {email} logged out")
     session.clear()
+    g.pop("user", None)
     flash("Logged out.", "info")
     return redirect(url_for("login"))
 
 # ---------- DASHBOARDS ----------
 
 @app.route("/dashboard")
-@login_required()
+@require_login
 def dashboard():
     user = current_user()
     db = get_db()
-    flights = db.execute("SELECT * FROM flights ORDER BY date_time ASC LIMIT 10").fetchall()
+    # Only the columns flight_results.html renders
+    flights = db.execute("SELECT flight_no, date_time, source, destination, vehicle_type FROM flights ORDER BY date_time ASC LIMIT 10").fetchall()
     
     if user["role"] == "admin":
-        uc = db.execute("SELECT COUNT(*) as c FROM users").fetchone()["c"]
-        rc = db.execute("SELECT COUNT(*) as c FROM rosters").fetchone()["c"]
+        uc, rc = db.execute("SELECT (SELECT COUNT(*) FROM users), (SELECT COUNT(*) FROM rosters)").fetchone()
         return render_template("dashboard_admin.html", user=user, flights=flights, user_count=uc, roster_count=rc)
     elif user["role"] == "operator":
         return render_template("dashboard_operator.html", user=user, flights=flights)
@@ -573,16 +961,14 @@ def dashboard():
 # ---------- ADMIN FUNCTIONS (RESTORED) ----------
 
 @app.route("/admin/users", methods=["GET", "POST"])
-@login_required(role="admin")
+@require_admin
 def manage_users():
     """Admin: Change user roles."""
     db = get_db()
     if request.method == "POST":
         uid, role = request.form["user_id"], request.form["role"]
-        target = db.execute("SELECT role FROM users WHERE id=?",(uid,)).fetchone()
-        if target and target["role"] != "admin":
-            db.execute("UPDATE users SET role=? WHERE id=?",(role,uid))
-            db.commit()
+        # Autocommit connection: the admin check and the change are one statement
+        if db.execute("UPDATE users SET role=? WHERE id=? AND role != 'admin'", (role, uid)).rowcount:
             flash("Role updated.", "success")
         else:
             flash("Cannot change admin role.", "danger")
@@ -590,33 +976,76 @@ def manage_users():
     return render_template("manage_users.html", user=current_user(), users=users)
 
 @app.route("/admin/logs")
-@login_required(role="admin")
+@require_admin
 def view_logs():
     """Admin: View system logs."""
+    flush_logs()  # show events still waiting in the log queue
     db = get_db()
     level = request.args.get("level")
-    sql = "SELECT * FROM logs WHERE level=? ORDER BY timestamp DESC LIMIT 200" if level else "SELECT * FROM logs ORDER BY timestamp DESC LIMIT 200"
-    logs = db.execute(sql, (level,) if level else ()).fetchall()
+    if level:
+        logs = db.execute(SQL_LOGS_BY_LEVEL, (level,)).fetchall()
+    else:
+        logs = db.execute(SQL_LOGS_RECENT).fetchall()
     return render_template("logs.html", user=current_user(), logs=logs, level=level)
 
 # ---------- FLIGHTS & BOOKING ----------
 
+SEARCH_COLUMNS = ("flight_no", "date_time", "source", "destination")
+
+SQL_FLIGHT_SEARCH_FTS = """
+    SELECT f.* FROM flights_fts JOIN flights f ON f.id = flights_fts.rowid
+    WHERE flights_fts MATCH ? ORDER BY f.id
+"""
+
+# LIKE fallback SQL for every combination of search columns, built once at import
+SQL_FLIGHT_SEARCH_LIKE = {
+    cols: "SELECT * FROM flights{} ORDER BY id".format(
+        " WHERE " + " AND ".join(f"{col} LIKE ?" for col in cols) if cols else "")
+    for n in range(len(SEARCH_COLUMNS) + 1)
+    for cols in itertools.combinations(SEARCH_COLUMNS, n)
+}
+
+def search_flights(db, filters):
+    """
+    Search flights by {column: text} filters (prefix match per column).
+    Uses the flights_fts index; falls back to LIKE when FTS5 is missing,
+    can't parse the input, or the user typed a '%' wildcard.
+    """
+    cols = tuple(col for col in SEARCH_COLUMNS if filters.get(col))
+    texts = [filters[col] for col in cols]
+    if not cols:
+        return db.execute(SQL_FLIGHT_SEARCH_LIKE[()]).fetchall()
+
+    if not any("%" in text for text in texts):
+        match = " AND ".join('{}:"{}"*'.format(col, text.replace('"', '""')) for col, text in zip(cols, texts))
+        try:
+            return db.execute(SQL_FLIGHT_SEARCH_FTS, (match,)).fetchall()
+        except sqlite3.OperationalError:
+            pass
+
+    # Prefix LIKE can use the NOCASE index on flight_no; '%' from the user keeps substring search
+    params = [text if "%" in text else f"{text}%" for text in texts]
+    return db.execute(SQL_FLIGHT_SEARCH_LIKE[cols], params).fetchall()
+
 @app.route("/flights", methods=["GET", "POST"])
-@login_required()
+@require_login
 def flight_search():
     flights = []
     if request.method == "POST":
         db = get_db()
-        fno = request.form.get("flight_no","").strip().upper()
-        flights = db.execute("SELECT * FROM flights WHERE flight_no LIKE ?", (f"%{fno}%",)).fetchall()
+        flights = search_flights(db, {
+            "flight_no": request.form.get("flight_no","").strip().upper(),
+            "date_time": request.form.get("date","").strip(),
+            "source": request.form.get("source","").strip(),
+            "destination": request.form.get("destination","").strip(),
+        })
     return render_template("flight_search.html", user=current_user(), flights=flights)
 
 @app.route("/book/<flight_no>", methods=["GET", "POST"])
-@login_required()
+@require_login
 def book_flight(flight_no):
-    check_and_update_schema()
     db = get_db()
-    flight = db.execute("SELECT * FROM flights WHERE flight_no = ?", (flight_no,)).fetchone()
+    flight = db.execute(SQL_FLIGHT_BY_NO, (flight_no,)).fetchone()
     
     if request.method == "POST":
         names = request.form.getlist("names[]")
@@ -631,17 +1060,16 @@ def book_flight(flight_no):
             flash(f"Infants (under {INFANT_AGE} years) cannot travel without an adult (18+ years).", "danger")
             return render_template("booking.html", user=current_user(), flight=flight)
         
-        pnr = generate_pnr()
-        while db.execute("SELECT 1 FROM passengers WHERE pnr=?", (pnr,)).fetchone():
+        # Probe (index seek on pnr) and insert under one write lock so two bookings can't share a PNR
+        with transaction(db, immediate=True):
             pnr = generate_pnr()
-
-        for i in range(len(names)):
-            db.execute("""
+            while db.execute("SELECT 1 FROM passengers WHERE pnr=?", (pnr,)).fetchone():
+                pnr = generate_pnr()
+            db.executemany("""
                 INSERT INTO passengers (flight_no, name, age, ssn, seat_type, pnr)
                 VALUES (?, ?, ?, ?, ?, ?)
-            """, (flight_no, names[i], ages[i], ssns[i], seat_types[i], pnr))
-        
-        db.commit()
+            """, [(flight_no, name, age, ssn, seat_type, pnr)
+                  for name, age, ssn, seat_type in zip(names, ages, ssns, seat_types, strict=True)])
         log_action("INFO", "BookFlight", f"PNR={pnr}")
         return redirect(url_for("booking_success", pnr=pnr))
 
@@ -650,11 +1078,10 @@ def book_flight(flight_no):
 @app.route("/booking/success/<pnr>")
 def booking_success(pnr):
     db = get_db()
-    passengers = db.execute("SELECT * FROM passengers WHERE pnr=?", (pnr,)).fetchall()
+    # Template only indexes p['...'], so sqlite3.Row works as-is (no dict copies)
+    passengers = db.execute(SQL_PNR_PASSENGERS, (pnr,)).fetchall()
     if not passengers: return "PNR not found"
-    # Convert sqlite3.Row objects to dictionaries for template compatibility
-    passengers = [dict(p) for p in passengers]
-    flight = db.execute("SELECT * FROM flights WHERE flight_no=?", (passengers[0]["flight_no"],)).fetchone()
+    flight = db.execute(SQL_FLIGHT_BY_NO, (passengers[0]["flight_no"],)).fetchone()
     return render_template("booking_success.html", user=current_user(), pnr=pnr, flight=flight, passengers=passengers)
 
 # ---------- CHECK-IN & SEAT MANAGEMENT ----------
@@ -666,19 +1093,19 @@ def checkin():
         pnr = request.form.get("pnr", "").strip().upper()
         db = get_db()
         
-        passengers = db.execute("SELECT * FROM passengers WHERE pnr = ?", (pnr,)).fetchall()
+        # Just what seat assignment needs
+        passengers = db.execute("SELECT id, flight_no, age, seat_type, seat_no FROM passengers WHERE pnr=?", (pnr,)).fetchall()
         if not passengers:
             flash("PNR not found.", "danger")
             return redirect(url_for("checkin"))
         
         flight_no = passengers[0]["flight_no"]
-        flight = db.execute("SELECT * FROM flights WHERE flight_no = ?", (flight_no,)).fetchone()
-        
-        # Auto-assign random seats if missing
-        perform_random_assignment(db, flight, passengers)
+        flight = db.execute(SQL_FLIGHT_BY_NO, (flight_no,)).fetchone()
         
-        # Auto-update roster snapshot after check-in
-        refresh_roster_snapshot(db, flight_no)
+        # Auto-assign random seats if missing, and update the roster snapshot in the same commit
+        with transaction(db, immediate=True):
+            perform_random_assignment(db, flight, passengers)
+            refresh_roster_snapshot(db, flight_no)
         
         log_action("INFO", "CheckIn", f"PNR={pnr} checked in for flight {flight_no}")
         return redirect(url_for("manage_booking", pnr=pnr))
@@ -688,58 +1115,49 @@ def checkin():
 def perform_random_assignment(db, flight, pnr_passengers):
     """Logic to assign random seats to checked-in passengers."""
     vehicle_type = flight["vehicle_type"]
-    all_seats = build_seat_map(vehicle_type)
-    
-    all_flight_pax = db.execute("SELECT seat_no FROM passengers WHERE flight_no = ?", (flight["flight_no"],)).fetchall()
-    occupied_seats = set(p["seat_no"] for p in all_flight_pax if p["seat_no"])
-    
-    free_business = [s["seat_no"] for s in all_seats if s["seat_type"] == "business" and s["seat_no"] not in occupied_seats]
-    free_economy = [s["seat_no"] for s in all_seats if s["seat_type"] == "economy" and s["seat_no"] not in occupied_seats]
-    
-    random.shuffle(free_business)
-    random.shuffle(free_economy)
     
-    updates_made = False
-    
-    for p in pnr_passengers:
-        if p["seat_no"]: continue
-        if p["age"] and int(p["age"]) < INFANT_AGE: continue # Infants skip
-            
-        needed_class = p["seat_type"]
-        assigned_seat = None
+    # Read occupancy under the write lock so two check-ins can't hand out the same seat
+    with transaction(db, immediate=True):
+        # Covered by idx_passengers_flight_seat, so this never touches the table rows
+        occupied_seats = {row[0] for row in db.execute(
+            "SELECT seat_no FROM passengers WHERE flight_no = ? AND seat_no IS NOT NULL", (flight["flight_no"],))}
         
-        if needed_class == "business":
-            if free_business: assigned_seat = free_business.pop()
-        else:
-            if free_economy: assigned_seat = free_economy.pop()
+        # Free seats per class from the cached class buckets; each assignment is then an O(1) pop
+        free_by_type = {t: [n for n in nos if n not in occupied_seats]
+                        for t, nos in seats_by_type(vehicle_type).items()}
         
-        if assigned_seat:
-            db.execute("UPDATE passengers SET seat_no = ? WHERE id = ?", (assigned_seat, p["id"]))
-            occupied_seats.add(assigned_seat)
-            updates_made = True
-            
-    if updates_made: db.commit()
+        for free in free_by_type.values():
+            random.shuffle(free)
+        
+        updates = []
+        for p in pnr_passengers:
+            if p["seat_no"]: continue
+            if p["age"] and int(p["age"]) < INFANT_AGE: continue # Infants skip
+                
+            free = free_by_type["business" if p["seat_type"] == "business" else "economy"]
+            if free:
+                updates.append((free.pop(), p["id"]))
+        
+        # seat_no IS NULL: skip passengers seated by a concurrent check-in of the same PNR
+        db.executemany("UPDATE passengers SET seat_no = ? WHERE id = ? AND seat_no IS NULL", updates)
 
 @app.route("/manage/<pnr>", methods=["GET", "POST"])
 def manage_booking(pnr):
     """Page to change seats for a PNR."""
     db = get_db()
     
-    # Fetch passengers associated with the PNR
-    passengers = db.execute("SELECT * FROM passengers WHERE pnr = ?", (pnr,)).fetchall()
+    # Fetch ALL passengers on the PNR's flight in one query (plain dicts for template
+    # compatibility); the PNR group is a subset, the full list feeds the seat map below
+    full_pax_list = fetch_dicts(db, """
+        SELECT * FROM passengers WHERE flight_no = (SELECT flight_no FROM passengers WHERE pnr = ? LIMIT 1)
+    """, (pnr,))
+    passengers = [p for p in full_pax_list if p["pnr"] == pnr]
     
     if not passengers:
         return redirect(url_for("checkin"))
     
-    # Convert sqlite3.Row objects to dictionaries for template compatibility
-    passengers = [dict(p) for p in passengers]
-    
     # Get flight details
-    flight = db.execute("SELECT * FROM flights WHERE flight_no = ?", (passengers[0]["flight_no"],)).fetchone()
-
-    # Fetch Pilot/Cabin data so sidebar appears in Check-in
-    pilots = [dict(p) for p in db.execute("SELECT * FROM pilots LIMIT 2")]
-    cabin = [dict(a) for a in db.execute("SELECT * FROM attendants LIMIT 4")]
+    flight = db.execute(SQL_FLIGHT_BY_NO, (passengers[0]["flight_no"],)).fetchone()
     
     # Handle seat change request (POST)
     if request.method == "POST":
@@ -747,40 +1165,34 @@ def manage_booking(pnr):
         new_seat = request.form.get("new_seat", "").strip().upper()
         
         # Find the specific passenger in the PNR group
-        target_pax = next((p for p in passengers if p["id"] == passenger_id), None)
+        target_pax = {p["id"]: p for p in passengers}.get(passenger_id)
         
         if target_pax:
             # Validate the new seat against the seat map
-            seat_map = build_seat_map(flight["vehicle_type"])
-            target_seat_info = next((s for s in seat_map if s["seat_no"] == new_seat), None)
-            
-            # Check if the seat is already occupied
-            occupant = db.execute("SELECT * FROM passengers WHERE flight_no = ? AND seat_no = ?", 
-                                  (flight["flight_no"], new_seat)).fetchone()
+            new_seat_type = seat_types_by_no(flight["vehicle_type"]).get(new_seat)
             
-            if not target_seat_info:
+            if not new_seat_type:
                 flash("Invalid seat.", "danger")
-            elif target_seat_info["seat_type"] != target_pax["seat_type"]:
+            elif new_seat_type != target_pax["seat_type"]:
                 flash("Wrong class (Cannot move between Economy/Business).", "danger")
-            elif occupant:
-                flash("Seat occupied.", "danger")
             else:
-                # Update the seat in the database
-                db.execute("UPDATE passengers SET seat_no = ? WHERE id = ?", (new_seat, passenger_id))
-                db.commit()
-                
-                # Auto-update roster snapshot after seat change
-                refresh_roster_snapshot(db, flight["flight_no"])
-
-                flash("Seat changed.", "success")
-                return redirect(url_for("manage_booking", pnr=pnr))
+                # Occupancy check and move in one statement; seat + roster snapshot in one commit
+                with transaction(db, immediate=True):
+                    cur = db.execute("""
+                        UPDATE passengers SET seat_no = ? WHERE id = ?
+                        AND NOT EXISTS (SELECT 1 FROM passengers WHERE flight_no = ? AND seat_no = ?)
+                    """, (new_seat, passenger_id, flight["flight_no"], new_seat))
+                    if cur.rowcount:
+                        refresh_roster_snapshot(db, flight["flight_no"])
+
+                if not cur.rowcount:
+                    flash("Seat occupied.", "danger")
+                else:
+                    flash("Seat changed.", "success")
+                    return redirect(url_for("manage_booking", pnr=pnr))
 
     # PREPARE DATA FOR VISUAL SEAT MAP
-    # 1. Fetch ALL passengers for the flight to show occupied seats
-    all_rows = db.execute("SELECT * FROM passengers WHERE flight_no = ?", (flight["flight_no"],)).fetchall()
-    
-    # 2. Convert sqlite3.Row objects to dictionaries to use .get() method safely
-    full_pax_list = [dict(row) for row in all_rows]
+    # 1-2. ALL passengers for the flight were fetched above (as dicts, so .get() works)
     
     # 3. Build the visual seat map using the dictionary list
     seat_rows = build_seat_rows(flight["vehicle_type"], full_pax_list)
@@ -790,6 +1202,9 @@ def manage_booking(pnr):
     all_seat_map = build_seat_map(flight["vehicle_type"])
     available_seats = [s for s in all_seat_map if s["seat_no"] not in occupied_set]
 
+    # Fetch Pilot/Cabin data so sidebar appears in Check-in
+    pilots, cabin = select_crew(db, flight)
+
     # Pass pilots and cabin here so the included template renders the sidebar
     return render_template("manage_booking.html", 
                            user=current_user(), pnr=pnr, flight=flight, 
@@ -798,7 +1213,7 @@ def manage_booking(pnr):
                            pilots=pilots, cabin=cabin)
 
 @app.route("/passenger/delete/<int:pax_id>", methods=["POST"])
-@login_required()
+@require_login
 def delete_passenger(pax_id):
     """Allows admin/operator to delete a passenger from DB."""
     user = current_user()
@@ -808,33 +1223,85 @@ def delete_passenger(pax_id):
         return redirect(url_for("dashboard"))
     
     db = get_db()
-    # Retrieve details BEFORE deletion for logging
-    pax = db.execute("SELECT * FROM passengers WHERE id=?", (pax_id,)).fetchone()
-    if not pax:
-        log_action("ERROR", "DeletePassenger", f"Passenger ID {pax_id} not found")
-        flash("Passenger not found.", "warning")
-        return redirect(url_for("dashboard"))
-    
-    flight_no = pax["flight_no"]
-    pax_name = pax["name"] # Store name for log
-    
-    db.execute("DELETE FROM passengers WHERE id=?", (pax_id,))
-    db.commit()
-    
+    # Delete and roster snapshot refresh commit together (a crash can't leave the snapshot listing a deleted passenger)
+    with transaction(db, immediate=True):
+        # Retrieve details BEFORE deletion for logging
+        pax = db.execute("SELECT flight_no, name FROM passengers WHERE id=?", (pax_id,)).fetchone()
+        if not pax:
+            log_action("ERROR", "DeletePassenger", f"Passenger ID {pax_id} not found")
+            flash("Passenger not found.", "warning")
+            return redirect(url_for("dashboard"))
+
+        flight_no = pax["flight_no"]
+        pax_name = pax["name"] # Store name for log
+        db.execute("DELETE FROM passengers WHERE id=?", (pax_id,))
+        refresh_roster_snapshot(db, flight_no)
+
     # LOGGING INFO level
     log_action("INFO", "DeletePassenger", f"{pax_name} deleted from flight {flight_no}")
     
-    # Also update the roster snapshot since data changed
-    refresh_roster_snapshot(db, flight_no)
-    
     flash("Passenger removed from database.", "success")
     # Redirect back to the roster view for this flight
     return redirect(url_for("view_latest_roster", flight_no=flight_no))
 
+@app.route("/flight/<flight_no>/update_seats_bulk", methods=["POST"])
+@require_login
+def update_seats_bulk(flight_no):
+    """Admin/Operator: move many passengers at once. Body: [{"passenger_id": 1, "seat_no": "12A"}, ...]"""
+    user = current_user()
+    if user["role"] not in ["admin", "operator"]:
+        log_action("ERROR", "UpdateSeatsBulk", f"Unauthorized access attempt by {user['email']}")
+        return jsonify({"error": "Unauthorized"}), 403
+
+    db = get_db()
+    flight = db.execute(SQL_FLIGHT_BY_NO, (flight_no,)).fetchone()
+    if not flight:
+        return jsonify({"error": "Flight not found"}), 404
+
+    changes = request.get_json(silent=True)
+    if not isinstance(changes, list):
+        return jsonify({"error": "Expected a JSON list"}), 400
+
+    seat_types = seat_types_by_no(flight["vehicle_type"])
+    new_seats = {}
+    for change in changes:
+        try:
+            pid = int(change["passenger_id"])
+            seat = str(change["seat_no"]).strip().upper()
+        except (KeyError, TypeError, ValueError):
+            return jsonify({"error": "Each entry needs passenger_id and seat_no"}), 400
+        if seat not in seat_types:
+            return jsonify({"error": f"Invalid seat {seat}"}), 400
+        new_seats[pid] = seat
+    if not new_seats:
+        return jsonify({"updated": 0})
+
+    # Read, validate and write under one write lock, so no check-in or seat change can
+    # take a seat between the occupancy check and the UPDATE (snapshot refreshed in the same commit)
+    with transaction(db, immediate=True):
+        pax = {p["id"]: p for p in db.execute("SELECT id, seat_type, seat_no FROM passengers WHERE flight_no=?", (flight_no,))}
+        for pid, seat in new_seats.items():
+            if pid not in pax:
+                return jsonify({"error": f"Passenger {pid} is not on flight {flight_no}"}), 400
+            if seat_types[seat] != pax[pid]["seat_type"]:
+                return jsonify({"error": f"Wrong class for seat {seat}"}), 400
+
+        # Validate the final seat plan as a whole so passengers can swap seats in one call
+        final = [new_seats.get(pid, p["seat_no"]) for pid, p in pax.items()]
+        taken = [seat for seat in final if seat]
+        if len(taken) != len(set(taken)):
+            return jsonify({"error": "Seat occupied"}), 409
+
+        rows = [(seat, pid, flight_no) for pid, seat in new_seats.items()]
+        db.executemany("UPDATE passengers SET seat_no=? WHERE id=? AND flight_no=?", rows)
+        refresh_roster_snapshot(db, flight_no)
+    log_action("INFO", "UpdateSeatsBulk", f"{len(rows)} seats updated on flight {flight_no}")
+    return jsonify({"updated": len(rows)})
+
 # ---------- ROSTER / ADMIN ROUTES ----------
 
 @app.route("/flight/<flight_no>/generate_roster")
-@login_required()
+@require_login
 def generate_roster(flight_no):
     """Generates roster for Admin/Operator (Simplified logic)."""
     # --- Check Permissions ---
@@ -845,13 +1312,20 @@ def generate_roster(flight_no):
     # -------------------------
 
     db = get_db()
-    flight = db.execute("SELECT * FROM flights WHERE flight_no=?", (flight_no,)).fetchone()
+    flight = db.execute(SQL_FLIGHT_BY_NO, (flight_no,)).fetchone()
+
+    # Pilots/Cabin
+    pilots, cabin = select_crew(db, flight)
+
+    # Nothing changed since the last generate and that roster is still the flight's latest
+    # (no newer snapshot from another process) -> reuse it instead of re-saving it
+    etag = roster_etag(db, flight, pilots, cabin)
+    cached = _roster_cache.get((DATABASE, flight_no))
+    if cached and cached[0] == etag and cached[1] == flight["latest_roster_id"]:
+        _roster_cache.move_to_end((DATABASE, flight_no))
+        return redirect(url_for("view_roster_by_id", roster_id=cached[1]))
     
-    passengers = [dict(p) for p in db.execute("SELECT * FROM passengers WHERE flight_no=?", (flight_no,)).fetchall()]
-    
-    # Mock Pilots/Cabin
-    pilots = [dict(p) for p in db.execute("SELECT * FROM pilots LIMIT 2")]
-    cabin = [dict(a) for a in db.execute("SELECT * FROM attendants LIMIT 4")]
+    passengers = fetch_dicts(db, SQL_FLIGHT_PASSENGERS, (flight_no,))
 
     roster = {
         "flight": dict(flight),
@@ -860,36 +1334,37 @@ def generate_roster(flight_no):
         "passengers": passengers
     }
     
-    cur = db.execute("INSERT INTO rosters (flight_no, created_at, data_json) VALUES (?,?,?)",
-               (flight_no, utc_now_iso(), json.dumps(roster)))
-    db.commit()
+    with transaction(db, immediate=True):
+        cur = db.execute("INSERT INTO rosters (flight_no, created_at, data_json) VALUES (?,?,?)",
+                   (flight_no, utc_now_iso(), orjson.dumps(roster)))
+        db.execute("UPDATE flights SET latest_roster_id=? WHERE flight_no=?", (cur.lastrowid, flight_no))
+    remember_roster(flight_no, etag, cur.lastrowid)
     
     return redirect(url_for("view_roster_by_id", roster_id=cur.lastrowid))
 
 @app.route("/flight/<flight_no>/roster")
-@login_required()
+@require_login
 def view_latest_roster(flight_no):
     """View the most recent roster for a flight."""
     db = get_db()
-    flight = db.execute("SELECT * FROM flights WHERE flight_no=?", (flight_no,)).fetchone()
+    flight = db.execute(SQL_FLIGHT_BY_NO, (flight_no,)).fetchone()
     if not flight: return "Flight not found"
 
-    # Get latest snapshot just for pilot/cabin info (or mock it)
-    row = db.execute("SELECT * FROM rosters WHERE flight_no=? ORDER BY created_at DESC LIMIT 1", (flight_no,)).fetchone()
+    # Get latest snapshot just for pilot/cabin info (or select it live)
+    row = db.execute("SELECT id, data_json FROM rosters WHERE id=?", (flight["latest_roster_id"],)).fetchone()
     
     # LIVE PASSENGERS
-    live_passengers = [dict(p) for p in db.execute("SELECT * FROM passengers WHERE flight_no=?", (flight_no,)).fetchall()]
+    live_passengers = fetch_dicts(db, SQL_FLIGHT_PASSENGERS, (flight_no,))
     
-    # Pilots/Cabin (either from snapshot or live mock)
+    # Pilots/Cabin (either from snapshot or live selection)
     if row:
-        roster_data = json.loads(row["data_json"])
+        roster_data = orjson.loads(row["data_json"])
         pilots = roster_data.get("pilots", [])
         cabin = roster_data.get("cabin", [])
         roster_id = row["id"]
     else:
         # Fallback if no roster snapshot exists yet
-        pilots = [dict(p) for p in db.execute("SELECT * FROM pilots LIMIT 2")]
-        cabin = [dict(a) for a in db.execute("SELECT * FROM attendants LIMIT 4")]
+        pilots, cabin = select_crew(db, flight)
         roster_id = None
 
     # Ensure visual map works by building rows with LIVE passengers
@@ -904,44 +1379,66 @@ def view_latest_roster(flight_no):
                            extended=extended)
 
 @app.route("/flight/<flight_no>/rosters")
-@login_required()
+@require_login
 def list_saved_rosters(flight_no):
     """List history of rosters."""
     db = get_db()
-    flight = db.execute("SELECT * FROM flights WHERE flight_no=?", (flight_no,)).fetchone()
+    flight = db.execute(SQL_FLIGHT_BY_NO, (flight_no,)).fetchone()
     rosters = db.execute("SELECT id, created_at FROM rosters WHERE flight_no=? ORDER BY created_at DESC", (flight_no,)).fetchall()
     return render_template("rosters_list.html", user=current_user(), flight=flight, rosters=rosters)
 
 @app.route("/roster/<int:roster_id>")
-@login_required()
+@require_login
 def view_roster_by_id(roster_id):
     """View a specific historical roster."""
     db = get_db()
     row = db.execute("SELECT * FROM rosters WHERE id=?", (roster_id,)).fetchone()
-    roster = json.loads(row["data_json"])
-    flight = db.execute("SELECT * FROM flights WHERE flight_no=?", (row["flight_no"],)).fetchone()
+    if not row:
+        abort(404)
+    # Page shows the logged-in user and gates sections on their role, so both go in the tag
+    user = current_user()
+    etag = snapshot_etag(row, user["id"], user["role"])
+    if client_has_snapshot(etag):
+        return private_cache(app.response_class(status=304), etag)
+    roster = orjson.loads(row["data_json"])
+    flight = db.execute(SQL_FLIGHT_BY_NO, (row["flight_no"],)).fetchone()
     
     seat_rows = build_seat_rows(flight["vehicle_type"], roster["passengers"])
 
     # ✅ Extended View data (ADDED)
     extended = build_extended_view(flight, roster.get("pilots", []), roster.get("cabin", []), roster.get("passengers", []))
 
-    return render_template("roster.html", user=current_user(), flight=flight, 
+    html = render_template("roster.html", user=user, flight=flight, 
                            pilots=roster["pilots"], cabin=roster["cabin"], 
                            passengers=roster["passengers"], seat_rows=seat_rows, roster_id=roster_id,
                            extended=extended)
+    return private_cache(make_response(html), etag)
 
 @app.route("/export/<flight_no>.json")
-@login_required()
+@require_login
 def export_roster(flight_no):
     db = get_db()
-    row = db.execute("SELECT data_json FROM rosters WHERE flight_no = ? ORDER BY created_at DESC LIMIT 1", (flight_no,)).fetchone()
+    row = db.execute("SELECT id, created_at, data_json FROM rosters WHERE id = (SELECT latest_roster_id FROM flights WHERE flight_no=?)", (flight_no,)).fetchone()
     if not row: 
         log_action("ERROR", "ExportRoster", f"No roster found for flight {flight_no}")
         return jsonify({"error": "No roster"}), 404
-    return jsonify(json.loads(row["data_json"]))
+    etag = snapshot_etag(row)
+    if client_has_snapshot(etag):
+        return private_cache(app.response_class(status=304), etag)
+    # Stored snapshot is already JSON, send it as-is instead of parse + re-dump
+    return private_cache(app.response_class(row["data_json"], mimetype="application/json"), etag)
 
 if __name__ == "__main__":
     with app.app_context():
         init_db()
-    app.run(debug=True, host="0.0.0.0", port=5001)
+    if os.environ.get("FLASK_DEBUG", "").lower() in ("1", "true"):
+        # Reloader + debugger, single process; not for load/perf testing
+        app.run(debug=True, host="0.0.0.0", port=5001)
+    else:
+        try:
+            # Multi-threaded WSGI server (optional: pip install waitress); threads share the pooled SQLite connections
+            from waitress import serve
+        except ImportError:
+            app.run(host="0.0.0.0", port=5001, threaded=True)
+        else:
+            serve(app, host="0.0.0.0", port=5001, threads=16)
@@ -0,0 +1,126 @@
+import os
+import uuid
+import sqlite3
+import pytest
+
+import app as frms_app
+
+# Tests are independent (own DB per test), so they can run sharded:
+#   pytest -n auto --dist=worksteal   (needs pytest-xdist)
+XDIST_WORKER = os.environ.get("PYTEST_XDIST_WORKER", "gw0")
+
+
+def memdb_uri():
+    # Private in-memory DB (memdb VFS: shared by every connection in this process,
+    # freed when the last one closes); worker id in the name for debugging xdist runs
+    return f"file:/frms-test-{XDIST_WORKER}-{uuid.uuid4().hex}?vfs=memdb"
+
+
+@pytest.fixture(scope="session")
+def template_db():
+    # Schema + seed built once per session; every test gets a page copy of it
+    uri = memdb_uri()
+    keeper = sqlite3.connect(uri, uri=True)
+    frms_app.DATABASE = uri
+    # Real scrypt hashes at a low cost (N=1024, ~3ms): the seeded admin and /register stay cheap to verify
+    frms_app.PASSWORD_HASH_METHOD = "scrypt:1024:8:1"
+    with frms_app.app.app_context():
+        frms_app.init_db()
+    yield keeper
+    keeper.close()
+
+
+@pytest.fixture()
+def memdb(template_db):
+    # Fresh copy of the template for one test (sqlite3 backup API, no SQL replayed)
+    uri = memdb_uri()
+    keeper = sqlite3.connect(uri, uri=True)
+    template_db.backup(keeper)
+    frms_app.DATABASE = uri
+    yield uri
+    keeper.close()
+
+
+@pytest.fixture(scope="session")
+def roster_template_db(template_db, configured_app):
+    # Template plus one generated IT1234 roster, for tests that only read an existing snapshot
+    uri = memdb_uri()
+    keeper = sqlite3.connect(uri, uri=True)
+    template_db.backup(keeper)
+    previous, frms_app.DATABASE = frms_app.DATABASE, uri
+    admin_id = keeper.execute("SELECT id FROM users WHERE email='admin@frms.local'").fetchone()[0]
+    with configured_app.test_client() as c:
+        with c.session_transaction() as s:
+            s["user_id"] = admin_id
+        assert c.get("/flight/IT1234/generate_roster").status_code == 302
+    frms_app.DATABASE = previous
+    yield keeper
+    keeper.close()
+
+
+@pytest.fixture()
+def with_roster(memdb, roster_template_db):
+    # Overwrite this test's DB with the roster template (request before the first client call)
+    con = sqlite3.connect(memdb, uri=True)
+    roster_template_db.backup(con)
+    con.close()
+
+
+@pytest.fixture(scope="session")
+def configured_app():
+    # Test config applied once for the whole session
+    frms_app.app.config["TESTING"] = True
+    frms_app.app.config["SECRET_KEY"] = "test-secret"
+    return frms_app.app
+
+
+@pytest.fixture(scope="session")
+def pooled_client(configured_app):
+    # One werkzeug client per session (per xdist worker); state is reset per test below
+    return configured_app.test_client()
+
+
+@pytest.fixture()
+def client(configured_app, pooled_client, memdb):
+    with pooled_client:
+        yield pooled_client
+    # Drop the session cookie so the next test starts logged out
+    pooled_client.delete_cookie(configured_app.config["SESSION_COOKIE_NAME"])
+
+
+PASSENGER_DEFAULTS = {"flight_no": "IT1234", "name": "Test Pax", "age": 30, "ssn": "12345678901",
+                      "seat_type": "economy", "seat_no": None, "pnr": "PNRTST"}
+
+
+@pytest.fixture()
+def insert_passenger(memdb):
+    # One connection per test; each call is a single INSERT + commit, id from cursor.lastrowid
+    con = sqlite3.connect(memdb, uri=True)
+
+    def _insert_passenger(**fields):
+        row = {**PASSENGER_DEFAULTS, **fields}
+        cur = con.execute(
+            f"INSERT INTO passengers ({', '.join(row)}) VALUES ({', '.join('?' * len(row))})",
+            tuple(row.values()))
+        con.commit()
+        return cur.lastrowid
+
+    yield _insert_passenger
+    con.close()
+
+
+@pytest.fixture()
+def auth_as(client, memdb):
+    # Log the client in by writing the session directly: no /login round trip, no password hash check.
+    # Non-admin roles get a user row ("<role>@test.local") created on first use.
+    def _auth_as(role="admin"):
+        email = "admin@frms.local" if role == "admin" else f"{role}@test.local"
+        con = sqlite3.connect(memdb, uri=True)
+        con.execute("INSERT OR IGNORE INTO users (email, password_hash, role) VALUES (?, '!', ?)", (email, role))
+        con.commit()
+        user_id = con.execute("SELECT id FROM users WHERE email=?", (email,)).fetchone()[0]
+        con.close()
+        with client.session_transaction() as s:
+            s["user_id"] = user_id
+
+    return _auth_as
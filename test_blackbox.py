@@ -1,32 +1,10 @@
-import os
-import tempfile
 import sqlite3
-import pytest
 
 import app as frms_app
 
 
-@pytest.fixture()
-def client():
-    fd, db_path = tempfile.mkstemp(suffix=".db")
-    os.close(fd)
-
-    frms_app.DATABASE = db_path
-    frms_app.app.config["TESTING"] = True
-    frms_app.app.config["SECRET_KEY"] = "test-secret"
-
-    with frms_app.app.app_context():
-        frms_app.init_db()
-
-    with frms_app.app.test_client() as client:
-        yield client
-
-    if os.path.exists(db_path):
-        os.remove(db_path)
-
-
 def db_conn():
-    con = sqlite3.connect(frms_app.DATABASE)
+    con = sqlite3.connect(frms_app.DATABASE, uri=True)
     con.row_factory = sqlite3.Row
     return con
 
@@ -53,8 +31,8 @@ def test_bb_register_then_login_works(client):
     r2 = client.post("/login", data={"email": "x@test.com", "password": "pw"}, follow_redirects=False)
     assert r2.status_code in (302, 303)
 
-def test_bb_logout_redirects_login(client):
-    login(client)
+def test_bb_logout_redirects_login(client, auth_as):
+    auth_as()
     r = client.get("/logout", follow_redirects=False)
     assert r.status_code in (302, 303)
     assert "/login" in r.headers.get("Location", "")
@@ -79,12 +57,19 @@ def test_bb_flights_requires_login(client):
     assert r.status_code in (302, 303)
     assert "/login" in r.headers.get("Location", "")
 
-def test_bb_flight_search_returns_page(client):
-    login(client)
+def test_bb_flight_search_returns_page(client, auth_as):
+    auth_as()
     r = client.post("/flights", data={"flight_no": "IT"}, follow_redirects=True)
     assert r.status_code == 200
     assert len(r.data) > 0
 
+def test_bb_flight_search_by_destination(client, auth_as):
+    auth_as()
+    r = client.post("/flights", data={"flight_no": "", "destination": "doha"}, follow_redirects=True)
+    assert r.status_code == 200
+    assert b"IT1007" in r.data
+    assert b"IT2345" not in r.data
+
 
 # ----------------- CHECKIN BLACKBOX -----------------
 
@@ -93,9 +78,9 @@ def test_bb_checkin_invalid_pnr_shows_error(client):
     assert r.status_code == 200
     assert b"PNR not found" in r.data
 
-def test_bb_checkin_valid_pnr_redirects_manage(client):
+def test_bb_checkin_valid_pnr_redirects_manage(client, auth_as):
     # first, book a flight to get a PNR
-    login(client)
+    auth_as()
     r = client.post(
         "/book/IT1234",
         data={
@@ -119,16 +104,15 @@ def test_bb_checkin_valid_pnr_redirects_manage(client):
 
 # ----------------- ROSTER EXPORT BLACKBOX -----------------
 
-def test_bb_export_roster_404_without_roster(client):
-    login(client)
+def test_bb_export_roster_404_without_roster(client, auth_as):
+    auth_as()
     r = client.get("/export/IT1234.json")
     assert r.status_code == 404
     assert r.is_json
     assert r.get_json().get("error") == "No roster"
 
-def test_bb_export_roster_success_after_generate(client):
-    login(client)
-    client.get("/flight/IT1234/generate_roster")
+def test_bb_export_roster_success_after_generate(client, auth_as, with_roster):
+    auth_as()
     r = client.get("/export/IT1234.json")
     assert r.status_code == 200
     assert r.is_json
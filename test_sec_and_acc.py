@@ -1,47 +1,21 @@
-import os
-import tempfile
 import sqlite3
-import pytest
 
 import app as frms_app
 
 
-@pytest.fixture()
-def client():
-    fd, db_path = tempfile.mkstemp(suffix=".db")
-    os.close(fd)
-
-    frms_app.DATABASE = db_path
-    frms_app.app.config["TESTING"] = True
-    frms_app.app.config["SECRET_KEY"] = "test-secret"
-
-    with frms_app.app.app_context():
-        frms_app.init_db()
-
-    with frms_app.app.test_client() as client:
-        yield client
-
-    if os.path.exists(db_path):
-        os.remove(db_path)
-
-
 def db_conn():
-    con = sqlite3.connect(frms_app.DATABASE)
+    con = sqlite3.connect(frms_app.DATABASE, uri=True)
     con.row_factory = sqlite3.Row
     return con
 
 
-def login_admin(client):
-    return client.post("/login", data={"email": "admin@frms.local", "password": "admin123"})
-
-
 # =========================================================
 # SECURITY TESTS
 # =========================================================
 
-def test_sec_logout_invalidates_session(client):
+def test_sec_logout_invalidates_session(client, auth_as):
     # Login -> logout -> Dashboard must redirect to login
-    login_admin(client)
+    auth_as()
     client.get("/logout")
 
     r = client.get("/dashboard", follow_redirects=False)
@@ -58,9 +32,9 @@ def test_sec_sql_injection_attempt_on_login_should_fail(client):
     assert b"Invalid credentials" in r.data
 
 
-def test_sec_sql_injection_like_input_on_flights_search_should_not_crash(client):
+def test_sec_sql_injection_like_input_on_flights_search_should_not_crash(client, auth_as):
     # Login needed to access /flights
-    login_admin(client)
+    auth_as()
 
     # "weird" input -> system should not crash
     r = client.post("/flights", data={"flight_no": "IT' OR 1=1 --"}, follow_redirects=True)
@@ -107,9 +81,9 @@ def test_acc_customer_end_to_end_register_login_search_book_checkin(client):
     assert f"/manage/{pnr}" in r5.headers.get("Location", "")
 
 
-def test_acc_admin_end_to_end_generate_export_delete(client):
+def test_acc_admin_end_to_end_generate_export_delete(client, auth_as, insert_passenger):
     # 1) Admin login
-    login_admin(client)
+    auth_as()
 
     # 2) Roster generate
     r2 = client.get("/flight/IT1234/generate_roster", follow_redirects=False)
@@ -123,14 +97,7 @@ def test_acc_admin_end_to_end_generate_export_delete(client):
     assert "flight" in data and "passengers" in data
 
     # 4) Add a passenger to delete later
-    con = db_conn()
-    con.execute("""
-        INSERT INTO passengers (flight_no, name, age, ssn, seat_type, seat_no, pnr)
-        VALUES (?,?,?,?,?,?,?)
-    """, ("IT1234", "ToDelete", 30, "99900011122", "economy", "10A", "PNRDEL"))
-    pax_id = con.execute("SELECT last_insert_rowid() AS id").fetchone()["id"]
-    con.commit()
-    con.close()
+    pax_id = insert_passenger(name="ToDelete", ssn="99900011122", seat_no="10A", pnr="PNRDEL")
 
     # 5) Delete passenger (with admin access)
     r5 = client.post(f"/passenger/delete/{pax_id}", follow_redirects=False)
@@ -1,36 +1,11 @@
-import os
-import tempfile
 import sqlite3
-import pytest
 
 import app as frms_app  # senin app.py
 
-@pytest.fixture()
-def client():
-    # Temporary DB file 
-    fd, db_path = tempfile.mkstemp(suffix=".db")
-    os.close(fd)
-
-    # Redirect app to use temp DB
-    frms_app.DATABASE = db_path
-    frms_app.app.config["TESTING"] = True
-    frms_app.app.config["SECRET_KEY"] = "test-secret"
-
-    # DB init + seed
-    with frms_app.app.app_context():
-        frms_app.init_db()
-
-    with frms_app.app.test_client() as client:
-        yield client
-
-    # Cleanup
-    if os.path.exists(db_path):
-        os.remove(db_path)
-
 
 def db_conn():
     # frms_app.DATABASE = connects to temp DB
-    con = sqlite3.connect(frms_app.DATABASE)
+    con = sqlite3.connect(frms_app.DATABASE, uri=True)
     con.row_factory = sqlite3.Row
     return con
 
@@ -54,34 +29,90 @@ def test_login_success_redirect_dashboard(client):
     assert r.status_code in (302, 303)
     assert "/dashboard" in r.headers.get("Location", "")
 
+def test_login_upgrades_legacy_pbkdf2_hash(client):
+    con = db_conn()
+    con.execute("UPDATE users SET password_hash=? WHERE email='admin@frms.local'",
+                (frms_app.generate_password_hash("admin123", method="pbkdf2:sha256:1"),))
+    con.commit()
+    con.close()
 
-# ---------- ROLE WHITEBOX ----------
+    r = client.post("/login", data={"email": "admin@frms.local", "password": "admin123"})
+    assert r.status_code in (302, 303)
+
+    con = db_conn()
+    h = con.execute("SELECT password_hash FROM users WHERE email='admin@frms.local'").fetchone()["password_hash"]
+    con.close()
+    assert h.startswith(frms_app.PASSWORD_HASH_METHOD)
 
-def login_as_viewer(client):
-    # open viewer user
-    client.post("/register", data={"email": "viewer@test.com", "password": "123"})
-    # login
-    client.post("/login", data={"email": "viewer@test.com", "password": "123"})
 
-def test_admin_users_role_mismatch_redirect(client):
-    login_as_viewer(client)
+# ---------- ROLE WHITEBOX ----------
+
+def test_admin_users_role_mismatch_redirect(client, auth_as):
+    auth_as("viewer")
     r = client.get("/admin/users", follow_redirects=False)
     # login_required(role="admin") -> redirect to dashboard
     assert r.status_code in (302, 303)
     assert "/dashboard" in r.headers.get("Location", "")
 
+def test_role_change_applies_without_relogin(client, auth_as):
+    auth_as("viewer")
+    assert client.get("/admin/users").status_code in (302, 303)
+
+    con = db_conn()
+    con.execute("UPDATE users SET role='admin' WHERE email='viewer@test.local'")
+    con.commit()
+    con.close()
+    assert client.get("/admin/users").status_code == 200
+
+def test_session_for_deleted_user_redirects_to_login(client):
+    client.post("/register", data={"email": "gone@test.com", "password": "pw"})
+    client.post("/login", data={"email": "gone@test.com", "password": "pw"})
+    con = db_conn()
+    con.execute("DELETE FROM users WHERE email='gone@test.com'")
+    con.commit()
+    con.close()
+
+    r = client.get("/dashboard", follow_redirects=False)
+    assert r.status_code in (302, 303)
+    assert "/login" in r.headers.get("Location", "")
+
+
+# ---------- LOGS WHITEBOX ----------
+
+def test_view_logs_shows_queued_events(client):
+    client.post("/login", data={"email": "admin@frms.local", "password": "admin123"})
+    # login event is still queued in memory; the view must flush it first
+    r = client.get("/admin/logs")
+    assert r.status_code == 200
+    assert b"User admin@frms.local logged in" in r.data
+
+def test_log_action_drops_when_queue_full(client, monkeypatch):
+    monkeypatch.setattr(frms_app, "LOG_QUEUE_MAX", 0)
+    before = frms_app._log_dropped
+    with frms_app.app.test_request_context():
+        frms_app.log_action("INFO", "Test", "dropped")
+    assert frms_app._log_dropped == before + 1
+    assert all(row[3] != "Test" for _, row in frms_app._log_buf)
+
+    # the next flush reports the drop as a WARN row
+    frms_app.flush_logs()
+    con = db_conn()
+    row = con.execute("SELECT level, details FROM logs WHERE action='LogQueue'").fetchone()
+    con.close()
+    assert row["level"] == "WARN" and "dropped" in row["details"]
+
 
 # ---------- ROSTER WHITEBOX ----------
 
-def test_export_roster_404_when_none(client):
+def test_export_roster_404_when_none(client, auth_as):
     # login needed
-    client.post("/login", data={"email": "admin@frms.local", "password": "admin123"})
+    auth_as()
     r = client.get("/export/IT1234.json")
     # warning: no roster snapshot + no latest -> 404
     assert r.status_code == 404
 
-def test_generate_roster_success_creates_row(client):
-    client.post("/login", data={"email": "admin@frms.local", "password": "admin123"})
+def test_generate_roster_success_creates_row(client, auth_as):
+    auth_as()
     r = client.get("/flight/IT1234/generate_roster", follow_redirects=False)
     assert r.status_code in (302, 303)
 
@@ -91,40 +122,77 @@ def test_generate_roster_success_creates_row(client):
     con.close()
     assert c >= 1
 
+def test_generate_roster_twice_reuses_unchanged_snapshot(client, auth_as):
+    auth_as()
+    r1 = client.get("/flight/IT1234/generate_roster", follow_redirects=False)
+    r2 = client.get("/flight/IT1234/generate_roster", follow_redirects=False)
+    # same roster page, no second snapshot row
+    assert r1.headers.get("Location") == r2.headers.get("Location")
 
-# ---------- DELETE PASSENGER WHITEBOX ----------
+    con = db_conn()
+    c = con.execute("SELECT COUNT(*) AS c FROM rosters WHERE flight_no='IT1234'").fetchone()["c"]
+    con.close()
+    assert c == 1
 
-def test_delete_passenger_unauthorized_for_viewer(client):
-    # viewer login
-    login_as_viewer(client)
+def test_generate_roster_skips_cache_when_latest_moved(client, auth_as):
+    auth_as()
+    r1 = client.get("/flight/IT1234/generate_roster", follow_redirects=False)
 
-    # Add a passenger to DB (IT1234 flight)
+    # another process saved a newer snapshot -> the cached roster is no longer the latest
     con = db_conn()
-    con.execute("""
-        INSERT INTO passengers (flight_no, name, age, ssn, seat_type, seat_no, pnr)
-        VALUES (?,?,?,?,?,?,?)
-    """, ("IT1234", "Temp Pax", 25, "12345678901", "economy", "10A", "PNR01"))
-    pax_id = con.execute("SELECT last_insert_rowid() AS id").fetchone()["id"]
+    cur = con.execute("INSERT INTO rosters (flight_no, created_at, data_json) "
+                      "SELECT flight_no, created_at, data_json FROM rosters WHERE flight_no='IT1234'")
+    con.execute("UPDATE flights SET latest_roster_id=? WHERE flight_no='IT1234'", (cur.lastrowid,))
     con.commit()
     con.close()
 
+    r2 = client.get("/flight/IT1234/generate_roster", follow_redirects=False)
+    assert r2.headers["Location"] != r1.headers["Location"]
+
+def test_roster_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(frms_app, "ROSTER_CACHE_MAX", 2)
+    monkeypatch.setattr(frms_app, "_roster_cache", frms_app.OrderedDict())
+    for i, flight_no in enumerate(["F1", "F2", "F3"]):
+        frms_app.remember_roster(flight_no, "tag", i)
+    assert [key[1] for key in frms_app._roster_cache] == ["F2", "F3"]
+
+def test_generate_roster_points_flight_at_new_snapshot(client, auth_as):
+    auth_as()
+    r = client.get("/flight/IT1234/generate_roster", follow_redirects=False)
+    assert r.status_code in (302, 303)
+
+    con = db_conn()
+    latest = con.execute("SELECT MAX(id) AS m FROM rosters WHERE flight_no='IT1234'").fetchone()["m"]
+    ptr = con.execute("SELECT latest_roster_id FROM flights WHERE flight_no='IT1234'").fetchone()[0]
+    con.close()
+    assert ptr == latest
+
+    # export follows the pointer
+    r = client.get("/export/IT1234.json")
+    assert r.status_code == 200
+    assert r.get_json()["flight"]["flight_no"] == "IT1234"
+
+
+
+# ---------- DELETE PASSENGER WHITEBOX ----------
+
+def test_delete_passenger_unauthorized_for_viewer(client, auth_as, insert_passenger):
+    # viewer login
+    auth_as("viewer")
+
+    # Add a passenger to DB (IT1234 flight)
+    pax_id = insert_passenger(name="Temp Pax", age=25, seat_no="10A", pnr="PNR01")
+
     r = client.post(f"/passenger/delete/{pax_id}", follow_redirects=False)
     # viewer -> unauthorized redirect dashboard
     assert r.status_code in (302, 303)
     assert "/dashboard" in r.headers.get("Location", "")
 
-def test_delete_passenger_success_for_admin(client):
-    client.post("/login", data={"email": "admin@frms.local", "password": "admin123"})
+def test_delete_passenger_success_for_admin(client, auth_as, insert_passenger):
+    auth_as()
 
     # add passenger
-    con = db_conn()
-    con.execute("""
-        INSERT INTO passengers (flight_no, name, age, ssn, seat_type, seat_no, pnr)
-        VALUES (?,?,?,?,?,?,?)
-    """, ("IT1234", "Delete Me", 30, "99900011122", "economy", "11A", "PNR02"))
-    pax_id = con.execute("SELECT last_insert_rowid() AS id").fetchone()["id"]
-    con.commit()
-    con.close()
+    pax_id = insert_passenger(name="Delete Me", ssn="99900011122", seat_no="11A", pnr="PNR02")
 
     r = client.post(f"/passenger/delete/{pax_id}", follow_redirects=False)
     assert r.status_code in (302, 303)
@@ -134,6 +202,16 @@ def test_delete_passenger_success_for_admin(client):
     row = con.execute("SELECT 1 FROM passengers WHERE id=?", (pax_id,)).fetchone()
     con.close()
     assert row is None
+
+def test_delete_passenger_refreshes_snapshot(client, auth_as, insert_passenger):
+    auth_as()
+    pax_id = insert_passenger(name="Delete Me", seat_no="11A", pnr="PNR02")
+    client.get("/flight/IT1234/generate_roster")
+
+    client.post(f"/passenger/delete/{pax_id}")
+    r = client.get("/export/IT1234.json")
+    assert pax_id not in [p["id"] for p in r.get_json()["passengers"]]
+
 def test_register_success_creates_user(client):
     r = client.post("/register", data={"email": "new@test.com", "password": "pw"}, follow_redirects=False)
     assert r.status_code in (302, 303)  # redirect to login
@@ -145,8 +223,8 @@ def test_register_success_creates_user(client):
     assert row["role"] == "viewer"
 
 
-def test_flight_search_post_returns_results(client):
-    client.post("/login", data={"email": "admin@frms.local", "password": "admin123"})
+def test_flight_search_post_returns_results(client, auth_as):
+    auth_as()
     r = client.post("/flights", data={"flight_no": "IT"}, follow_redirects=True)
     assert r.status_code == 200
     # Page html can change, but response should contain some data
@@ -159,8 +237,8 @@ def test_booking_success_pnr_not_found(client):
     assert b"PNR not found" in r.data
 
 
-def test_view_latest_roster_fallback_when_no_snapshot(client):
-    client.post("/login", data={"email": "admin@frms.local", "password": "admin123"})
+def test_view_latest_roster_fallback_when_no_snapshot(client, auth_as):
+    auth_as()
 
     # clear the rosters table -> no snapshot exists
     con = db_conn()
@@ -178,9 +256,8 @@ def test_checkin_invalid_pnr_shows_error(client):
     assert b"PNR not found" in r.data
 
 
-def test_export_roster_success_after_generate(client):
-    client.post("/login", data={"email": "admin@frms.local", "password": "admin123"})
-    client.get("/flight/IT1234/generate_roster")
+def test_export_roster_success_after_generate(client, auth_as, with_roster):
+    auth_as()
 
     r = client.get("/export/IT1234.json")
     assert r.status_code == 200
@@ -188,3 +265,106 @@ def test_export_roster_success_after_generate(client):
     data = r.get_json()
     assert "flight" in data
     assert "passengers" in data
+
+def test_export_roster_304_until_snapshot_changes(client, auth_as, with_roster, insert_passenger):
+    auth_as()
+    r1 = client.get("/export/IT1234.json")
+    etag = r1.headers["ETag"]
+    assert "private" in r1.headers["Cache-Control"]
+
+    r2 = client.get("/export/IT1234.json", headers={"If-None-Match": etag})
+    assert r2.status_code == 304
+
+    # a seat change refreshes the snapshot -> new tag, full body
+    a = insert_passenger(name="Pax A", seat_no="10A", pnr="PNRBLK")
+    client.post("/manage/PNRBLK", data={"passenger_id": a, "new_seat": "11C"})
+    r3 = client.get("/export/IT1234.json", headers={"If-None-Match": etag})
+    assert r3.status_code == 200
+    assert r3.headers["ETag"] != etag
+
+def test_view_roster_by_id_404_for_unknown_id(client, auth_as):
+    auth_as()
+    assert client.get("/roster/9999").status_code == 404
+
+def test_view_roster_by_id_etag_changes_with_role(client, auth_as, with_roster):
+    auth_as("operator")
+    con = db_conn()
+    roster_id = con.execute("SELECT latest_roster_id FROM flights WHERE flight_no='IT1234'").fetchone()[0]
+    r1 = client.get(f"/roster/{roster_id}")
+    etag = r1.headers["ETag"]
+
+    # role-gated sections change, so the cached page must not be reused
+    con.execute("UPDATE users SET role='viewer' WHERE email='operator@test.local'")
+    con.commit()
+    con.close()
+    r2 = client.get(f"/roster/{roster_id}", headers={"If-None-Match": etag})
+    assert r2.status_code == 200
+    assert r2.headers["ETag"] != etag
+
+
+# ---------- BULK SEAT UPDATE WHITEBOX ----------
+
+def test_update_seats_bulk_swaps_seats(client, auth_as, insert_passenger):
+    auth_as()
+    a = insert_passenger(name="Pax A", seat_no="10A", pnr="PNRBLK")
+    b = insert_passenger(name="Pax B", seat_no="10B", pnr="PNRBLK")
+
+    r = client.post("/flight/IT1234/update_seats_bulk",
+                    json=[{"passenger_id": a, "seat_no": "10B"}, {"passenger_id": b, "seat_no": "10A"}])
+    assert r.status_code == 200
+    assert r.get_json()["updated"] == 2
+
+    con = db_conn()
+    seats = {row["id"]: row["seat_no"] for row in con.execute("SELECT id, seat_no FROM passengers WHERE pnr='PNRBLK'")}
+    con.close()
+    assert seats == {a: "10B", b: "10A"}
+
+def test_update_seats_bulk_empty_list_writes_nothing(client, auth_as):
+    auth_as()
+    r = client.post("/flight/IT1234/update_seats_bulk", json=[])
+    assert r.status_code == 200
+    assert r.get_json()["updated"] == 0
+
+    # no transaction, so no roster snapshot refresh either
+    con = db_conn()
+    c = con.execute("SELECT COUNT(*) AS c FROM rosters WHERE flight_no='IT1234'").fetchone()["c"]
+    con.close()
+    assert c == 0
+
+def test_update_seats_bulk_rejects_double_booking(client, auth_as, insert_passenger):
+    auth_as()
+    a = insert_passenger(name="Pax A", seat_no="10A", pnr="PNRBLK")
+    insert_passenger(name="Pax B", seat_no="10B", pnr="PNRBLK")
+
+    r = client.post("/flight/IT1234/update_seats_bulk", json=[{"passenger_id": a, "seat_no": "10B"}])
+    assert r.status_code == 409
+
+    con = db_conn()
+    seat = con.execute("SELECT seat_no FROM passengers WHERE id=?", (a,)).fetchone()["seat_no"]
+    con.close()
+    assert seat == "10A"
+
+def test_manage_booking_seat_change_updates_snapshot(client, auth_as, insert_passenger):
+    auth_as()
+    a = insert_passenger(name="Pax A", seat_no="10A", pnr="PNRBLK")
+
+    r = client.post("/manage/PNRBLK", data={"passenger_id": a, "new_seat": "11C"})
+    assert r.status_code in (302, 303)
+
+    # passenger row and latest snapshot were written together
+    r = client.get("/export/IT1234.json")
+    assert r.status_code == 200
+    seats = {p["id"]: p["seat_no"] for p in r.get_json()["passengers"]}
+    assert seats[a] == "11C"
+
+def test_manage_booking_rejects_occupied_seat(client, insert_passenger):
+    a = insert_passenger(name="Pax A", seat_no="10A", pnr="PNRBLK")
+    insert_passenger(name="Pax B", seat_no="10B", pnr="PNRBLK")
+
+    r = client.post("/manage/PNRBLK", data={"passenger_id": a, "new_seat": "10B"}, follow_redirects=True)
+    assert b"Seat occupied." in r.data
+
+    con = db_conn()
+    seat = con.execute("SELECT seat_no FROM passengers WHERE id=?", (a,)).fetchone()["seat_no"]
+    con.close()
+    assert seat == "10A"